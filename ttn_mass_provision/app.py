@@ -13,31 +13,174 @@
 #
 ##############################################################################
 
+# this must be first
+from __future__ import annotations
+
 #### imports ####
 import argparse
+import asyncio
+import concurrent.futures
+import functools
 import getpass
 from importlib.resources import files as importlib_files
-import invoke
-import io
 import ipaddress
-import jsons
+import json
 import logging
+import os
 import pathlib
 import re
+import socket
+import struct
+import subprocess
 import sys
-import time
-import typing
-
-Any = typing.Any
-Union = typing.Union
-List = typing.List
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, List
 
 from .constants import Constants
 from .__version__ import __version__
-from .conduit import Conduit
-from .jumphost import Jumphost
 from .settings import Settings
 
+# Conduit and Jumphost pull in fabric (and so paramiko and cryptography);
+# they are imported where first used, so that --help and --version don't
+# pay for them.
+if TYPE_CHECKING:
+    from .conduit import Conduit
+    from .jumphost import Jumphost
+
+# the logger for this module
+_logger = logging.getLogger(__name__)
+
+# translation table for turning xx:xx:xx:xx:xx:xx MAC addresses into xx-xx-xx-xx-xx-xx
+_MAC_TRANS = str.maketrans(':', '-')
+
+# netlink values used for dumping the neighbor (ARP) table; from
+# <linux/netlink.h>, <linux/rtnetlink.h> and <linux/neighbour.h>.
+_NLMSG_HDR = struct.Struct("=LHHLL")    # nlmsghdr: len, type, flags, seq, pid
+_NDMSG = struct.Struct("=BBHiHBB")      # ndmsg: family, pad, pad, ifindex, state, flags, type
+_RTATTR = struct.Struct("=HH")          # rtattr: len, type
+_NLMSG_ERROR = 2
+_NLMSG_DONE = 3
+_RTM_NEWNEIGH = 28
+_RTM_GETNEIGH = 30
+_NLM_F_REQUEST = 0x001
+_NLM_F_DUMP = 0x300
+_NDA_DST = 1
+_NDA_LLADDR = 2
+_NUD_UNUSABLE = 0x01 | 0x20 | 0x40      # NUD_INCOMPLETE | NUD_FAILED | NUD_NOARP
+
+
+# the regular expression for the /proc/net/arp rows (IP address, HW type,
+# flags, HW address, ...) whose HW address has one of the given OUIs.
+@functools.lru_cache(maxsize=None)
+def _proc_net_arp_re(ouis: frozenset[str]) -> re.Pattern[bytes]:
+    alternatives = b'|'.join(re.escape(oui.encode()) for oui in sorted(ouis))
+    return re.compile(rb'^(\S+)\s+\S+\s+\S+\s+((?:' + alternatives + rb')(?::[0-9a-fA-F]{2}){3})\s', re.M | re.I)
+
+# the regular expression for the lines of `arp -an` output; octets may
+# be printed without leading zeros.
+_ARP_AN_RE = re.compile(r'\S+ \((?P<ip>[0-9.]+)\) at (?P<macaddr>[0-9a-fA-F]?[0-9a-fA-F](:[0-9a-fA-F]?[0-9a-fA-F]){5})\s')
+
+# the contents of one of the files packaged with the app; these don't
+# change while we're running, so each is only read once.
+@functools.lru_cache(maxsize=None)
+def _read_resource(name: str) -> bytes:
+    return importlib_files("ttn_mass_provision").joinpath(name).read_bytes()
+
+# the local user name; it doesn't change while we're running, so look
+# it up once.
+@functools.lru_cache(maxsize=None)
+def _local_username() -> str:
+    return getpass.getuser()
+
+# the defaults for the jumphost settings other than the hostname, as a
+# new dict each time, so callers are free to change it.
+def _jumphost_defaults() -> dict:
+    return {
+        "username": _local_username(),
+        "port": 22,
+        "first_uid": Constants.JUMPHOST_FIRST_UID,
+        "first_keepalive": Constants.JUMPHOST_FIRST_KEEPALIVE
+        }
+
+# the host addresses of a network, in the same order as network.hosts(),
+# as dotted-quad strings; we don't need an IPv4Address for each one.
+def _host_strings(network: ipaddress.IPv4Network) -> Iterator[str]:
+    first = int(network.network_address)
+    last = int(network.broadcast_address)
+    if network.prefixlen < 31:
+        # skip the network and broadcast addresses
+        first += 1
+        last -= 1
+    for address in range(first, last + 1):
+        yield socket.inet_ntoa(address.to_bytes(4, 'big'))
+
+##############################################################################
+#
+# The argument parser; it doesn't depend on the App instance, so it's
+# built once and reused.
+#
+##############################################################################
+
+@functools.lru_cache(maxsize=1)
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="ttn_mass_provision",
+        description=
+            """
+            Initialize all mLinux Conduits on a network segment to connect
+            to a jumphost.
+            """
+        )
+
+    #	Debugging
+    group = parser.add_argument_group("Debugging options")
+    group.add_argument("-d", "--debug",
+                    dest="debug", default=False,
+                    action='store_true',
+                    help="Print debugging messages.")
+    group.add_argument("--nodebug",
+                    dest="debug",
+                    action='store_false',
+                    help="Do not print debugging messages.")
+    group.add_argument("-v", "--verbose",
+                    dest="verbose", default=False,
+                    action='store_true',
+                    help="Print verbose messages.")
+    group.add_argument("-n", "--noop", "--dry-run",
+                    dest="noop", default=False,
+                    action='store_true',
+                    help="Don't make changes, just list what we are going to do.")
+    parser.add_argument(
+                    "--version",
+                    action='version',
+                    help="Print version and exit.",
+                    version="%(prog)s v"+__version__
+                    )
+
+    #	Options
+    group = parser.add_argument_group("Configuration options")
+    group.add_argument("--username", "--user", "-U",
+                    dest="username", default=Constants.DEFAULT_MLINUX_USERNAME,
+                    help="Username to use to connect (default %(default)s).")
+    group.add_argument("--password", "--pass", "-P",
+                    dest="password", required=True,
+                    help="Password to use to connect. There is no default; this must always be supplied.")
+    group.add_argument("--address", "-A",
+                    dest="address", default=Constants.DEFAULT_IP_ADDRESS,
+                    help="IP address of the network holding the Conduits, as IpV4 addr/bits (default %(default)s).")
+
+    group.add_argument("--skip-if-ssh-fails", "-S",
+                    dest="skip_if_ssh_fails",
+                    action='store_true',
+                    help="skip any candidate gateway if not able to log in with SSH, rather than failing"
+                    )
+
+    group = parser.add_argument_group("Provisioning options")
+    group.add_argument("--organization",
+                    dest="organization",
+                    default=Constants.DEFAULT_ORG_NAME,
+                    help="default organization name (default %(default)s).")
+
+    return parser
 
 ##############################################################################
 #
@@ -50,26 +193,30 @@ class App():
         # load the constants
         self.constants = Constants()
 
-        # load the settings -- must be before parsing args
+        # parse the args first: the parser doesn't need the settings, and
+        # this way --help and --version exit before we read any files.
+        self.organization : Settings.Organization | None = None
+        self.conduits : dict[ipaddress.IPv4Address, Conduit] = dict()
+        options = self._parse_arguments()
+        self.args = options
+
+        # load the settings -- must be before validating args
         self._load_settings()
 
         self._load_authorized_keys()
         self._load_ssh_tunnel()
 
-        # now parse the args
-        self.organization : Settings.Organization | None = None
-        options = self._parse_arguments()
-        self.args = options
-
-        # set up logging
+        # set up logging. The level is set once, on the package logger; the
+        # per-module loggers all inherit it.
         logging.basicConfig(format="%(levelname)s: %(module)s: %(message)s")
-        logger = logging.getLogger(__name__)
+        package_logger = logging.getLogger(__package__)
         if options.debug:
-            logger.setLevel('DEBUG')
+            package_logger.setLevel('DEBUG')
         elif options.verbose:
-            logger.setLevel('INFO')
+            package_logger.setLevel('INFO')
         else:
-            logger.setLevel('WARNING')
+            package_logger.setLevel('WARNING')
+        logger = _logger
 
         self.logger = logger
 
@@ -86,45 +233,40 @@ class App():
     # load the settings file during initialization.
     def _load_settings(self):
         # read the JSON settings file
-        settings_file = importlib_files("ttn_mass_provision").joinpath("settings.json")
-        if not settings_file.is_file():
-            raise self.Error(f"Can't find setup JSON file: {settings_file}")
+        settings_bytes = self._read_resource_file("settings.json", "setup JSON file")
 
-        settings_text = ""
+        # the file is plain JSON; json.loads() takes the UTF-8 bytes directly.
         try:
-            settings_text = settings_file.read_text()
-        except:
-            raise self.Error(f"Can't read: {settings_file}")
-
-        settings_dict: dict = jsons.loads(settings_text)
+            settings_dict: dict = json.loads(settings_bytes)
+        except ValueError as e:
+            raise self.Error(f"Can't parse: settings.json: {e}")
         self.settings = settings_dict
 
     # load the authorized keys
     def _load_authorized_keys(self):
         # read the public keys file
-        conduit_authorized_key_file = importlib_files("ttn_mass_provision").joinpath("conduit_authorized_keys.pub")
-        if not conduit_authorized_key_file.is_file():
-            raise self.Error(f"Can't find authorized keys file: {conduit_authorized_key_file}")
-        try:
-            conduit_authorized_key_text = conduit_authorized_key_file.read_text()
-        except Exception as e:
-            raise self.Error(f"Can't read: {conduit_authorized_key_text}: {e}")
+        conduit_authorized_key_text = self._read_resource_file("conduit_authorized_keys.pub", "authorized keys file").decode()
 
-        self.authorized_keys: list = [ x.strip() for x in conduit_authorized_key_text.splitlines() ]
+        # skip blank lines; they aren't keys.
+        self.authorized_keys: list = list(filter(None, map(str.strip, conduit_authorized_key_text.splitlines())))
 
     # load the ssh_tunnel script
     def _load_ssh_tunnel(self):
-        # read the public keys file
-        ssh_tunnel_file = importlib_files("ttn_mass_provision").joinpath("ssh_tunnel")
-        if not ssh_tunnel_file.is_file():
-            raise self.Error(f"Can't find ssh_tunnel file: {ssh_tunnel_file}")
-        try:
-            ssh_tunnel_text = ssh_tunnel_file.read_text()
-        except Exception as e:
-            raise self.Error(f"Can't read: {ssh_tunnel_text}: {e}")
+        # read the ssh_tunnel script
+        ssh_tunnel_text = self._read_resource_file("ssh_tunnel", "ssh_tunnel file").decode()
 
         self.settings["ssh_tunnel_script"] = [ line.strip() for line in ssh_tunnel_text.splitlines() ]
 
+    # read one of our packaged files. We just try to read it; a missing
+    # file shows up as FileNotFoundError, so there's no need to stat first.
+    def _read_resource_file(self, name: str, description: str) -> bytes:
+        try:
+            return _read_resource(name)
+        except FileNotFoundError:
+            raise self.Error(f"Can't find {description}: {importlib_files('ttn_mass_provision').joinpath(name)}")
+        except OSError as e:
+            raise self.Error(f"Can't read: {importlib_files('ttn_mass_provision').joinpath(name)}: {e}")
+
     class Error(Exception):
         """ this is the Exception thrown by class App """
         pass
@@ -141,79 +283,18 @@ class App():
             self.logger.error("not a directory: %s", str(self.inventory_dir))
             sys.exit(1)
 
-        if len(self.jumphosts) != 1:
-            self.logger.error(f"{len(self.jumphosts)=}; can never be zero and for now must be exactly 1")
+        if len(self._jumphost_attrs) != 1:
+            self.logger.error("len(self.jumphosts)=%d; can never be zero and for now must be exactly 1", len(self._jumphost_attrs))
             sys.exit(1)
 
-        pass
-
     ##########################################################################
     #
-    # The argument parser
+    # Parse the arguments, using the shared parser
     #
     ##########################################################################
 
     def _parse_arguments(self):
-        parser = argparse.ArgumentParser(
-            prog="ttn_mass_provision",
-            description=
-                """
-                Initialize all mLinux Conduits on a network segment to connect
-                to a jumphost.
-                """
-            )
-
-        #	Debugging
-        group = parser.add_argument_group("Debugging options")
-        group.add_argument("-d", "--debug",
-                        dest="debug", default=False,
-                        action='store_true',
-                        help="Print debugging messages.")
-        group.add_argument("--nodebug",
-                        dest="debug",
-                        action='store_false',
-                        help="Do not print debugging messages.")
-        group.add_argument("-v", "--verbose",
-                        dest="verbose", default=False,
-                        action='store_true',
-                        help="Print verbose messages.")
-        group.add_argument("-n", "--noop", "--dry-run",
-                        dest="noop", default=False,
-                        action='store_true',
-                        help="Don't make changes, just list what we are going to do.")
-        parser.add_argument(
-                        "--version",
-                        action='version',
-                        help="Print version and exit.",
-                        version="%(prog)s v"+__version__
-                        )
-
-        #	Options
-        group = parser.add_argument_group("Configuration options")
-        group.add_argument("--username", "--user", "-U",
-                        dest="username", default=Constants.DEFAULT_MLINUX_USERNAME,
-                        help="Username to use to connect (default %(default)s).")
-        group.add_argument("--password", "--pass", "-P",
-                        dest="password", required=True,
-                        help="Password to use to connect. There is no default; this must always be supplied.")
-        group.add_argument("--address", "-A",
-                        dest="address", default=Constants.DEFAULT_IP_ADDRESS,
-                        help="IP address of the network holding the Conduits, as IpV4 addr/bits (default %(default)s).")
-
-        group.add_argument("--skip-if-ssh-fails", "-S",
-                        dest="skip_if_ssh_fails",
-                        action='store_true',
-                        help="skip any candidate gateway if not able to log in with SSH, rather than failing"
-                        )
-
-        group = parser.add_argument_group("Provisioning options")
-        group.add_argument("--organization",
-                        dest="organization",
-                        default=Constants.DEFAULT_ORG_NAME,
-                        help="default organization name (default %(default)s).")
-
-
-        options = parser.parse_args()
+        options = _build_parser().parse_args()
         if options.debug:
             options.verbose = options.debug
 
@@ -233,52 +314,61 @@ class App():
         try:
             options.address = ipaddress.IPv4Network(options.address)
         except Exception as error:
-            print("not a valid network address: %s: %s" % (options.address, error))
+            logger.error("not a valid network address: %s: %s", options.address, error)
             sys.exit(1)
 
-        if options.organization in self.settings["organizations"]:
+        organizations: dict = self.settings["organizations"]
+        jumphost_settings: dict = self.settings["jumphosts"]
+
+        if options.organization in organizations:
             org_data = {
                 "id": options.organization,
                 "gateway_group": options.organization + "-gateways"
                 }
-            org_data |= self.settings["organizations"][options.organization]
+            org_data |= organizations[options.organization]
             try:
                 self.organization = Settings.Organization(**org_data)
             except Exception as e:
                 raise self.Error(
                     f"can't convert Organization() for organization {options.organization:s}: check settings.json: {e}")
         else:
-            print("not a valid organization: %s" % options.organization)
+            logger.error("not a valid organization: %s", options.organization)
             sys.exit(1)
 
-        # now, get the jumphosts
-        jumphosts : list[Jumphost] = []
+        # now, get the jumphost attributes; the Jumphost objects themselves
+        # are created when first needed.
+        jumphost_attrs : list[Settings.JumphostAttributes] = []
         for jumphost_tag in self.organization.jumphosts:
-            if not jumphost_tag in self.settings["jumphosts"]:
+            if not jumphost_tag in jumphost_settings:
                 raise self.Error(
                     f"unknown jumphost tag {jumphost_tag} in organization {options.organization}, check settings.json"
                     )
-            jumphost_data = {
-                "hostname": jumphost_tag,
-                "username": getpass.getuser(),
-                "port": 22,
-                "first_uid": Constants.JUMPHOST_FIRST_UID,
-                "first_keepalive": Constants.JUMPHOST_FIRST_KEEPALIVE
-                }
-            jumphost_data |= self.settings["jumphosts"][jumphost_tag]
+            jumphost_data = { "hostname": jumphost_tag, **_jumphost_defaults(), **jumphost_settings[jumphost_tag] }
             try:
                 jumphost_attr = Settings.JumphostAttributes(**jumphost_data)
             except Exception as e:
                 raise self.Error(
                     f"can't convert jumphost data: org {options.organization:s}, jumphost {jumphost_tag}, data: {jumphost_data}, error: {e}"
                     )
-            jumphost = Jumphost(jumphost_attr, options, self.settings)
-            logger.debug("jumphost[%d]: %s", len(jumphosts), jumphost)
-            jumphosts.append(jumphost)
+            jumphost_attrs.append(jumphost_attr)
 
-        self.jumphosts = jumphosts
+        self._jumphost_attrs = jumphost_attrs
         return options
 
+    # the Jumphost objects, created on first use: creating one imports
+    # fabric and sets up its ssh connection, which --help, --version
+    # and the argument checks don't need.
+    @functools.cached_property
+    def jumphosts(self) -> list[Jumphost]:
+        from .jumphost import Jumphost
+
+        jumphosts : list[Jumphost] = []
+        for jumphost_attr in self._jumphost_attrs:
+            jumphost = Jumphost(jumphost_attr, self.args)
+            self.logger.debug("jumphost[%d]: %s", len(jumphosts), jumphost)
+            jumphosts.append(jumphost)
+        return jumphosts
+
     #################
     # Test jumposts #
     #################
@@ -287,8 +377,15 @@ class App():
 
         logger.debug("check_jumphosts")
         result = True
-        for jumphost in self.jumphosts:
-            if not jumphost.isreachable():
+
+        # probe them all at once; each one opens its own connection, which
+        # the later phases then reuse.
+        jumphosts = self.jumphosts
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(jumphosts)) as executor:
+            reachable = list(executor.map(lambda jumphost: jumphost.isreachable(), jumphosts))
+
+        for jumphost, ok in zip(jumphosts, reachable):
+            if not ok:
                 logger.error("can't reach jumphost %s", jumphost.hostname)
                 result = False
             else:
@@ -300,98 +397,190 @@ class App():
     ##################################################
     # Find all the MultiTech gateways on the network #
     ##################################################
+
+    # probe one host by trying to open the ssh port. Any answer at all,
+    # including a refused connection, means the host is up; and as a side
+    # effect the kernel now has its MAC address in the ARP cache.
+    async def _probe(self, ip: str, semaphore: asyncio.Semaphore) -> str | None:
+        async with semaphore:
+            try:
+                _, writer = await asyncio.wait_for(
+                    asyncio.open_connection(ip, Constants.PROBE_PORT),
+                    timeout=Constants.PROBE_TIMEOUT
+                    )
+            except ConnectionRefusedError:
+                return ip
+            except (OSError, asyncio.TimeoutError):
+                return None
+
+            writer.close()
+            return ip
+
+    # probe all the hosts concurrently, and return the set that answered.
+    # Launches are staggered slightly so that we don't put hundreds of SYNs
+    # (and the ARP requests they trigger) on the wire in the same instant.
+    async def _probe_all(self, hosts: Iterable[str]) -> set[str]:
+        semaphore = asyncio.Semaphore(Constants.PROBE_CONCURRENCY)
+        tasks: list[asyncio.Task] = []
+        for host in hosts:
+            tasks.append(asyncio.create_task(self._probe(host, semaphore)))
+            await asyncio.sleep(Constants.PROBE_STAGGER)
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        return { ip for ip in results if isinstance(ip, str) }
+
+    # read the ARP cache, returning a dict mapping IP address (as a string)
+    # to MAC address (formatted as xx-xx-xx-xx-xx-xx) for the entries whose OUI (first
+    # three octets) is in ouis. On Linux we ask the kernel via netlink, falling
+    # back to /proc/net/arp; elsewhere we fall back to `arp -an`.
+    def _read_arp_table(self, ouis: frozenset[str] = Constants.MULTITECH_OUIS) -> dict[str, str]:
+        arp_table: dict[str, str] = dict()
+
+        if hasattr(socket, "AF_NETLINK"):
+            try:
+                return self._read_arp_table_netlink(ouis)
+            except (OSError, TimeoutError, struct.error) as error:
+                # TimeoutError: no end-of-dump message arrived in time;
+                # struct.error: a short or truncated netlink message
+                self.logger.debug("netlink neighbor dump failed, trying /proc/net/arp: %s", error)
+
+        if os.path.exists("/proc/net/arp"):
+            # one regex pass over the raw bytes finds the rows we want; other
+            # rows (and the header) are rejected without being split or decoded.
+            with open("/proc/net/arp", "rb") as f:
+                arp_bytes = f.read()
+            for match in _proc_net_arp_re(ouis).finditer(arp_bytes):
+                ip, macaddr = match.group(1).decode(), match.group(2).decode().lower()
+                arp_table[ip] = macaddr.translate(_MAC_TRANS)
+            return arp_table
+
+        result = subprocess.run(["arp", "-an"], capture_output=True, text=True, check=True)
+        for line in result.stdout.split('\n'):
+            match = _ARP_AN_RE.match(line)
+            if not match:
+                continue
+            # the regex guarantees hex digits; only the zero-padding needs fixing.
+            macaddr = ':'.join(octet.zfill(2) for octet in match.group('macaddr').lower().split(':'))
+            if not macaddr[:8] in ouis:
+                continue
+            arp_table[match.group('ip')] = macaddr.translate(_MAC_TRANS)
+        return arp_table
+
+    # read the ARP cache with a netlink RTM_GETNEIGH dump. The kernel hands
+    # back binary records, so there is no text to parse, and the OUI can be
+    # checked on the raw bytes.
+    def _read_arp_table_netlink(self, ouis: frozenset[str]) -> dict[str, str]:
+        arp_table: dict[str, str] = dict()
+        raw_ouis = frozenset(bytes.fromhex(oui.replace(':', '')) for oui in ouis)
+        header_size = _NLMSG_HDR.size + _NDMSG.size
+
+        with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE) as sock:
+            # don't wait forever if the kernel never finishes the dump.
+            sock.settimeout(Constants.NETLINK_TIMEOUT)
+            sock.bind((0, 0))
+            sock.sendall(
+                _NLMSG_HDR.pack(header_size, _RTM_GETNEIGH, _NLM_F_REQUEST | _NLM_F_DUMP, 1, 0) +
+                _NDMSG.pack(socket.AF_INET, 0, 0, 0, 0, 0, 0)
+                )
+
+            while True:
+                data = sock.recv(65536)
+                offset = 0
+                while offset + _NLMSG_HDR.size <= len(data):
+                    msg_len, msg_type, _, _, _ = _NLMSG_HDR.unpack_from(data, offset)
+                    if msg_len < _NLMSG_HDR.size:
+                        raise OSError(f"malformed netlink message: length {msg_len}")
+                    if msg_type == _NLMSG_DONE:
+                        return arp_table
+                    if msg_type == _NLMSG_ERROR:
+                        error = -int.from_bytes(data[offset + _NLMSG_HDR.size : offset + _NLMSG_HDR.size + 4], sys.byteorder, signed=True)
+                        if error != 0:
+                            raise OSError(error, os.strerror(error))
+
+                    if msg_type == _RTM_NEWNEIGH:
+                        family, _, _, _, state, _, _ = _NDMSG.unpack_from(data, offset + _NLMSG_HDR.size)
+                        if family == socket.AF_INET and not (state & _NUD_UNUSABLE):
+                            dst: bytes | None = None
+                            lladdr: bytes | None = None
+                            attr = offset + header_size
+                            end = offset + msg_len
+                            while attr + _RTATTR.size <= end:
+                                attr_len, attr_type = _RTATTR.unpack_from(data, attr)
+                                if attr_len < _RTATTR.size:
+                                    break
+                                if attr_type == _NDA_DST:
+                                    dst = data[attr + _RTATTR.size : attr + attr_len]
+                                elif attr_type == _NDA_LLADDR:
+                                    lladdr = data[attr + _RTATTR.size : attr + attr_len]
+                                attr += (attr_len + 3) & ~3
+
+                            if dst is not None and lladdr is not None and len(lladdr) == 6 and lladdr[:3] in raw_ouis:
+                                arp_table[socket.inet_ntoa(dst)] = lladdr.hex('-')
+
+                    offset += (msg_len + 3) & ~3
+
     def find_conduits(self) -> bool:
-        ARP_RE = re.compile(r'\S+ \((?P<ip>[0-9.]+)\) at (?P<macaddr>0?0:0?8:0?0(:[0-9a-fA-F]?[0-9a-fA-F]){3})\s')
+        from .conduit import Conduit
+
         options = self.args
         logger = self.logger
 
-        stdout = io.StringIO()
-
-        hosts = ' '.join([ str(host) for host in options.address.hosts()])
-        cmd = "for i in %s; do { ( ping -c2 -W1 $i 2>&1 | grep -q '0 received' || echo $i ; ) & disown; } done" % hosts
         try:
-            logger.debug("launch command: %s", cmd)
-            result = invoke.run(cmd, out_stream=stdout)
+            responders = asyncio.run(self._probe_all(_host_strings(options.address)))
         except Exception as error:
-            logger.error("mass ping failed: %s", error)
+            logger.error("network probe failed: %s", error)
             return False
 
-        # grab the arp table
-        cmd = "arp -an"
+        logger.debug("%d hosts answered on port %d", len(responders), Constants.PROBE_PORT)
+
         try:
-            logger.debug("Running %s", cmd)
-            result = invoke.run(cmd, out_stream=stdout)
+            arp_table = self._read_arp_table()
         except Exception as error:
-            logger.error("%s failed: %s", cmd, error)
+            logger.error("can't read ARP table: %s", error)
             return False
 
         conduits: List[Conduit] = []
-        macaddrs = dict()
-        for line in result.stdout.split('\n'):
-            match = ARP_RE.match(line)
-            if not match:
-                continue
-            macaddr = '-'.join(["%02x" % int(hex, 16) for hex in match.group('macaddr').split(':')])
+        macaddrs: set[str] = set()
+        for ip, macaddr in arp_table.items():
+            # the probe is only there to fill the ARP cache; a MultiTech host
+            # that didn't answer in time is still a conduit, and the ssh
+            # check will report it if it really can't be reached.
+            if not ip in responders:
+                logger.info("%s (%s) didn't answer on port %d", ip, macaddr, Constants.PROBE_PORT)
             if macaddr in macaddrs:
                 logger.info("duplicate macaddr: %s", macaddr)
             else:
                 conduits.append(
                     Conduit(
-                        ip=ipaddress.IPv4Address(match.group('ip')),
+                        ip=ip,
                         mac=macaddr,
                         options=options,
                         settings=self.settings
                     )
                 )
-                macaddrs[macaddr] = True
-        self.conduits = conduits
-        self.conduits.sort(key=lambda conduit: conduit.mac)
+                macaddrs.add(macaddr)
+        # keep them in MAC address order, indexed by IP address.
+        conduits.sort(key=lambda conduit: conduit.mac)
+        self.conduits = { conduit.ip: conduit for conduit in conduits }
         return True
 
-    ##################################
-    # Populate the Conduit type info #
-    ##################################
-    def get_product_ids(self) -> bool:
-        result: bool = True
-        for conduit in self.conduits:
-            self.logger.info("%s: attributes %s", conduit.mac, conduit.product_attributes)
-            if conduit.get_product_id():
-                conduit.set_product_attributes()
-            else:
-                result = False
-        return result
-
-    ##############################
-    # Populate the gateway names #
-    ##############################
-    def populate_gateway_names(self) -> bool:
-        result: bool = True
-        for conduit in self.conduits:
-            result = conduit.generate_hostname(self.organization.prefix) and result
-            result = conduit.generate_friendly_name(self.organization) and result
-        return result
-
-    #####################
-    # Get the host keys #
-    #####################
-    def get_host_keys(self) -> bool:
-        result : bool = True
-        for conduit in self.conduits:
-            if not conduit.fetch_gateway_public_key():
-                self.logger.error("Can't get host key for %s", conduit.mac)
-                result = False
-        return result
-
-    ##########################
-    # Get the lorawan GW ids #
-    ##########################
-    def get_lora_eui64(self) -> bool:
-        result : bool = True
-        for conduit in self.conduits:
-            if not conduit.fetch_lora_eui64():
-                self.logger.error("Can't get LoRa EUI64 for %s", conduit.mac)
-                result = False
-        return result
+    ##########################################################
+    # Run a per-conduit step on all the conduits in parallel #
+    ##########################################################
+
+    # the steps are mostly waiting on ssh, and each Conduit has its own
+    # connection, so they can overlap. Results are in conduit order.
+    def _map_conduits(self, fn: Callable[[Conduit], bool]) -> list[bool]:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=Constants.SSH_MAX_WORKERS) as executor:
+            return list(executor.map(fn, self.conduits.values()))
+
+    ###############################################################
+    # Get the product info, names, host key and LoRa EUI64 of all #
+    # the Conduits                                                #
+    ###############################################################
+    def gather_conduit_info(self) -> bool:
+        organization = self.organization
+        return all(self._map_conduits(lambda conduit: conduit.gather_info(organization)))
 
     #############################################
     # Create the gateway group on each jumphost #
@@ -421,37 +610,41 @@ class App():
 
         #
         # we don't want to handle multiple user ids on multi jumphosts: no way to test.
-        # so the below code
-        for conduit in self.conduits:
-            for jumphost in self.jumphosts:
+        # so the below code. Each jumphost creates all the users in one batch.
+        for jumphost in self.jumphosts:
+            users: list[tuple[int | None, str, str]] = []
+            for conduit in self.conduits.values():
                 username = conduit.hostname
                 userid = conduit.get_jumphost_userid(jumphost)
-                logger.info("%s: create gateway user %s group %s%s",
+                logger.info("%s: create gateway user %s group %s with user id %s",
                             jumphost.hostname, username, gateway_group,
-                            f" with user id {userid}" if userid != None else ""
+                            "auto" if userid is None else userid
                             )
-                current_uid = jumphost.create_jumphost_user(desired_uid=userid, gateway_id=username, gateway_name=username, gateway_groupname=gateway_group)
-                if current_uid == None:
+                users.append((userid, username, username))
+
+            current_uids = jumphost.create_jumphost_users(users, gateway_groupname=gateway_group)
+            for conduit, (userid, username, _) in zip(self.conduits.values(), users):
+                current_uid = current_uids[username]
+                if current_uid is None:
                     result = False
                     logger.debug("failed to create user %s (uid %s) for gateway %s on jumphost %s",
                                  username,
-                                 "auto" if userid == None else str(userid),
+                                 "auto" if userid is None else str(userid),
                                  conduit.mac, jumphost.hostname
                                  )
                 else:
                     conduit.set_jumphost_userid(jumphost, userid=current_uid)
 
-                # if we successfully got this far, confirm ssh
-                if result:
-                    userid = conduit.get_jumphost_reverse_socket(jumphost)
-
-                    if not jumphost.add_gateway_user_ssh_authorization(
-                        keys=[ conduit.public_key ],
-                        username=username,
-                        gateway_group=gateway_group
-                        ):
-                        logger.error("%s: %s: failed to create ssh entries for user %s", conduit.mac, jumphost.hostname, username)
-                        result = False
+        # if we successfully got this far, confirm ssh. All the gateways'
+        # keys go to each jumphost as one batch.
+        if result:
+            for jumphost in self.jumphosts:
+                if not jumphost.add_gateway_users_ssh_authorization(
+                    [ (conduit.hostname, [ conduit.public_key ]) for conduit in self.conduits.values() ],
+                    gateway_group=gateway_group
+                    ):
+                    logger.error("%s: failed to create ssh entries for gateway users", jumphost.hostname)
+                    result = False
 
         return result
 
@@ -459,20 +652,43 @@ class App():
     def setup_jumphost_tunnels_on_gateways(self) -> bool:
         # we know that there is exactly one jumphost, but we
         # code for multiple here and block it above.
+        # Each gateway is only talking to itself over its own connection (the
+        # jumphost isn't contacted), so the gateways can be done in parallel.
         logger = self.logger
-        result = True
-        for conduit in self.conduits:
-            for jumphost in self.jumphosts:
-                if not conduit.setup_jumphost_tunnel(jumphost, authorized_keys=self.authorized_keys):
+        jumphosts = self.jumphosts
+        authorized_keys = self.authorized_keys
+
+        def setup_tunnels(conduit: Conduit) -> bool:
+            result = True
+            for jumphost in jumphosts:
+                if not conduit.setup_jumphost_tunnel(jumphost, authorized_keys=authorized_keys):
                     result = False
                     logger.error("%s: %s: failed to set up tunnel", conduit.mac, jumphost.hostname)
+            return result
 
-        return result
+        return all(self._map_conduits(setup_tunnels))
+
+    ##########################################
+    # Close the ssh connections we've opened #
+    ##########################################
+    def close_connections(self) -> None:
+        for conduit in self.conduits.values():
+            conduit.ssh.close()
+        for jumphost in self.jumphosts:
+            jumphost.ssh.close()
 
     #################################
     # Run the app and return status #
     #################################
     def run(self) -> int:
+        # each Conduit and Jumphost keeps its ssh connection open from first
+        # use through all the phases; close them all when we're done.
+        try:
+            return self._run()
+        finally:
+            self.close_connections()
+
+    def _run(self) -> int:
         options = self.args
         logger = self.logger
 
@@ -484,17 +700,20 @@ class App():
             logger.error("couldn't find any conduits")
             return 1
 
-        logger.info("found %d conduits: %s", len(self.conduits), [ str(x) for x in self.conduits ])
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("found %d conduits: %s", len(self.conduits), [ str(x) for x in self.conduits.values() ])
 
         no_ssh: List[str] = []
-        good_ssh: List[Conduit] = []
+        good_ssh: dict[ipaddress.IPv4Address, Conduit] = dict()
+
+        logger.info("check ssh for %d conduits", len(self.conduits))
+        ssh_results = self._map_conduits(lambda conduit: conduit.check_ssh_enabled())
 
-        for conduit in self.conduits:
-            logger.info("check ssh for %s", str(conduit.ip))
-            if not conduit.check_ssh_enabled():
+        for conduit, ssh_ok in zip(self.conduits.values(), ssh_results):
+            if not ssh_ok:
                 no_ssh.append(f"{conduit.mac}({str(conduit.ip)})")
             else:
-                good_ssh.append(conduit)
+                good_ssh[conduit.ip] = conduit
 
         if len(no_ssh) > 0:
             if not options.skip_if_ssh_fails:
@@ -510,28 +729,16 @@ class App():
                             len(no_ssh),
                             ', '.join(no_ssh)
                            )
+                for conduit in self.conduits.values():
+                    if not conduit.ip in good_ssh:
+                        conduit.ssh.close()
                 self.conduits = good_ssh
         else:
             logger.info("all %d Conduits were reachable", len(self.conduits))
 
-        # get all the product IDs for the Conduits
-        if not self.get_product_ids():
-            logger.error("get_product_ids() failed")
-            return 1
-
-        # populate the gateway names and descriptions
-        if not self.populate_gateway_names():
-            logger.error("populate_gateway_names failed")
-            return 1
-
-        # populate the host keys
-        if not self.get_host_keys():
-            logger.error("get_host_keys() failed")
-            return 1
-
-        # populate the lora EUI64
-        if not self.get_lora_eui64():
-            logger.error("get_lora_eui64() failed")
+        # get the product IDs, names, host keys and LoRa EUI64s for the Conduits
+        if not self.gather_conduit_info():
+            logger.error("gather_conduit_info() failed")
             return 1
 
         # create the jumphost gateway groups
@@ -19,12 +19,16 @@ import os
 import tempfile
 import typing
 
+# the process umask. The API only lets us read it by changing it, so do
+# that once, at import, rather than for every new file.
+_PROCESS_UMASK = os.umask(0)
+os.umask(_PROCESS_UMASK)
+
 class AtomicFile(object):
     def __init__(self, name, mode: str = "w", /, createmode: int | None =None, encoding=None):
-        def _maketemp(name: str, mode: str, createmode : int | None = None, encoding=None):
+        def _maketemp(name: str, mode: str, text: bool, createmode : int | None = None, encoding=None):
             directory, filename = os.path.split(name)
             fd, tempname = tempfile.mkstemp(prefix=f".{filename}-", suffix=".tmp", dir=directory, text=text)
-            print(f"{fd=} {tempname=}")
             try:
                 file = os.fdopen(fd=fd, mode=mode, encoding=encoding)
             except:
@@ -46,16 +50,15 @@ class AtomicFile(object):
                     raise
                 # file doesn't exist so we need to supply a mode
                 if createmode == None:
-                    # lame API forces us to change umask to change it.
-                    umask = os.umask(0)
-                    os.umask(umask)
-
-                    st_mode = ~umask
+                    st_mode = ~_PROCESS_UMASK
                 else:
                     st_mode = createmode
                 # turn off x bits -- this might be wrong, but..
                 st_mode &= 0o666
-            os.chmod(tempname, st_mode)
+            # mkstemp() asks for 0o600, but the umask applies to that too, so
+            # check what we actually got.
+            if st_mode != os.fstat(file.fileno()).st_mode & 0o777:
+                os.chmod(tempname, st_mode)
 
             return file, tempname
 
@@ -67,26 +70,20 @@ class AtomicFile(object):
         else:
             text = True
 
-        file, tempname = _maketemp(name, mode, createmode=createmode, encoding=encoding)
+        file, tempname = _maketemp(name, mode, text, createmode=createmode, encoding=encoding)
 
         self._fp = file
         self._tempname = tempname
         self._name = name
 
-        # delegated methods
-        self.fileno = file.fileno
-        self.flush = self._fp.flush
-        self.read = self._fp.read
-        self.readable = self._fp.readable
-        self.readline = self._fp.readline
-        self.readlines = self._fp.readlines
-        self.seek = self._fp.seek
-        self.seekable = self._fp.seekable
-        self.tell = self._fp.tell
-        self.truncate = self._fp.truncate
-        self.writable = self._fp.writable
-        self.write = self._fp.write
-        self.writelines = self._fp.writelines
+    # everything we don't define ourselves (write, flush, fileno, ...) is
+    # delegated to the temporary file. __getattr__ is only called for names
+    # that aren't found normally, so close(), discard() and so forth win.
+    def __getattr__(self, name):
+        # _fp itself is missing if the constructor failed; don't recurse.
+        if name == "_fp":
+            raise AttributeError(name)
+        return getattr(self._fp, name)
 
     def __enter__(self):
         return self
@@ -14,7 +14,6 @@
 ##############################################################################
 
 #### imports ####
-from dataclasses import dataclass
 import ipaddress
 import logging
 import pathlib
@@ -31,6 +30,9 @@ from .conduit_ssh import ConduitSsh
 from .jumphost import Jumphost
 from .settings import Settings
 
+# the logger for this module
+_logger = logging.getLogger(__name__)
+
 ##############################################################################
 #
 # The Conduit SSH API
@@ -38,13 +40,19 @@ from .settings import Settings
 ##############################################################################
 
 class Conduit():
+    # there can be a lot of these, so don't give each one a __dict__
+    __slots__ = (
+        'ip', 'mac', 'logger', 'options', 'ssh', 'settings',
+        'product_id', 'product_attributes', 'hostname', 'friendly_name',
+        'public_key', 'lora_eui64', 'jumphost_userid'
+        )
+
     def __init__(self, ip: Union[ipaddress.IPv4Address, str], mac: str, options, settings: dict):
-        self.ip = ipaddress.IPv4Address(ip)
+        self.ip = ip if isinstance(ip, ipaddress.IPv4Address) else ipaddress.IPv4Address(ip)
         self.mac = mac
-        self.logger = logging.getLogger(__name__)
-        logger = self.logger
+        self.logger = _logger
         self.options = options
-        self.ssh = ConduitSsh(options, host=ip)
+        self.ssh = ConduitSsh(options, host=str(self.ip))
         self.settings: dict = settings
 
         # these are populated later
@@ -56,14 +64,6 @@ class Conduit():
         self.lora_eui64 : str | None = None
         self.jumphost_userid : int | None = None
 
-        # set the log level
-        if options.debug:
-            logger.setLevel('DEBUG')
-        elif options.verbose:
-            logger.setLevel('INFO')
-        else:
-            logger.setLevel('WARNING')
-
         pass
 
     def __str__(self):
@@ -73,6 +73,46 @@ class Conduit():
         """ this is the Exception thrown by class Conduit """
         pass
 
+    # the commands used to query the Conduit
+    PRODUCT_ID_COMMAND = "mts-io-sysfs show product-id"
+    PUBLIC_KEY_COMMAND = "cat /etc/ssh/ssh_host_rsa_key.pub"
+    LORA_EUI64_COMMAND = "mts-io-sysfs show lora/eui"
+
+    # the line that follows each command's output in query(), with its exit status
+    QUERY_MARKER = "--ttn_mass_provision-status--"
+
+    ##########################################################
+    # Run several commands in one remote command. Returns the #
+    # first line of each command's output, or None for one    #
+    # that failed; or None if we couldn't run them at all.    #
+    ##########################################################
+    def query(self, commands: list[str]) -> list[str | None] | None:
+        c = self.ssh
+        logger = self.logger
+        marker = self.QUERY_MARKER
+
+        # the marker goes on a line of its own even if the output doesn't
+        # end with a newline; the empty lines this leaves are skipped.
+        result = c.do("; ".join(f"{command}; printf '\\n%s %s\\n' {marker} $?" for command in commands), hide=True)
+        logger.debug("query: %r", result)
+        if result is None or not result.ok:
+            return None
+
+        answers: list[str | None] = []
+        lines: list[str] = []
+        for line in result.stdout.splitlines():
+            if line.startswith(marker + " "):
+                status = line[len(marker) + 1:].strip()
+                answers.append(lines[0] if status == "0" and len(lines) > 0 else None)
+                lines = []
+            elif line:
+                lines.append(line)
+
+        if len(answers) != len(commands):
+            logger.error("%s: query: expected %d answers, got %d", self.mac, len(commands), len(answers))
+            return None
+        return answers
+
     ################################
     # Check whether SSH is enabled #
     ################################
@@ -87,37 +127,19 @@ class Conduit():
             logger.info("ssh to %s is not working", self.ip)
             return False
 
-    ##################################
-    # Get the MultiTech Conduit type #
-    ##################################
-    def get_product_id(self, /, timeout: int | None = None) -> bool:
-        c = self.ssh
-        logger = self.logger
-
-        result = c.do("mts-io-sysfs show product-id", hide=True)
-        logger.debug("mts-io-sysfs: %s", repr(result))
-        if result == None or not result.ok:
-            return False
-
-        product_id: str = result.stdout.splitlines()[0]
-        logger.info("product_id for %s: %s", self.mac, product_id)
-        self.product_id = product_id
-
-        return True
-
     ###################################################
     # Set the product attributes given the product ID #
     ###################################################
     def set_product_attributes(self) -> bool:
-        if not self.product_id in self.settings["product_id_map"]:
-            raise self.Error("%s: unknown product type: %s", self.mac, self.product_id)
+        product_data = self.settings["product_id_map"].get(self.product_id)
+        if product_data is None:
+            raise self.Error("%s: unknown product type: %s" % (self.mac, self.product_id))
 
         try:
-            self.product_attributes = Settings.ProductAttributes(**self.settings["product_id_map"][self.product_id])
+            self.product_attributes = Settings.ProductAttributes(**product_data)
         except Exception as e:
-            raise self.Error("can't convert product_attributes for product_id %s: check settings.json: %s",
-                            self.product_id,
-                            e)
+            raise self.Error("can't convert product_attributes for product_id %s: check settings.json: %s" %
+                            (self.product_id, e))
         return True
 
     ##########################################
@@ -138,39 +160,43 @@ class Conduit():
         self.logger.debug("%s: friendly_name set to %s", self.mac, self.friendly_name)
         return True
 
-    ####################################
-    # Get the gatway's public host key #
-    ####################################
-    def fetch_gateway_public_key(self, /, timeout: int | None = None) -> bool:
-        c = self.ssh
+    #####################################################################
+    # Gather everything we need to know about this Conduit, in one pass #
+    # over its ssh connection                                           #
+    #####################################################################
+    def gather_info(self, org: Settings.Organization) -> bool:
         logger = self.logger
 
-        result = c.do("cat /etc/ssh/ssh_host_rsa_key.pub", hide=True)
-        logger.debug("cat: %s", repr(result))
-        if result == None or not result.ok:
+        # one round trip for the product ID, host key and LoRa EUI64.
+        answers = self.query([ self.PRODUCT_ID_COMMAND, self.PUBLIC_KEY_COMMAND, self.LORA_EUI64_COMMAND ])
+        if answers is None:
+            logger.error("Can't query %s", self.mac)
             return False
+        product_id, public_key, lora_eui64 = answers
 
-        gateway_public_key: str = result.stdout.splitlines()[0].strip()
-        logger.info("gateway public host key for %s: %s", self.mac, gateway_public_key)
-        self.public_key = gateway_public_key
+        if product_id is None:
+            logger.error("Can't get product ID for %s", self.mac)
+            return False
+        self.product_id = product_id.strip()
+        logger.info("product_id for %s: %s", self.mac, self.product_id)
 
-        return True
+        self.set_product_attributes()
+        logger.info("%s: attributes %r", self.mac, self.product_attributes)
 
-    #################################
-    # Get the MultiTech lora EUI-64 #
-    #################################
-    def fetch_lora_eui64(self, /, timeout: int | None = None) -> bool:
-        c = self.ssh
-        logger = self.logger
+        if not self.generate_hostname(org.prefix) or not self.generate_friendly_name(org):
+            return False
 
-        result = c.do("mts-io-sysfs show lora/eui", hide=True)
-        logger.debug("mts-io-sysfs show lora/eui: %s", repr(result))
-        if result == None or not result.ok:
+        if public_key is None:
+            logger.error("Can't get host key for %s", self.mac)
             return False
+        self.public_key = public_key.strip()
+        logger.info("gateway public host key for %s: %s", self.mac, self.public_key)
 
-        lora_eui64: str = result.stdout.splitlines()[0].lower()
-        logger.info("lora_eui64 for %s: %s", self.mac, lora_eui64)
-        self.lora_eui64 = lora_eui64
+        if lora_eui64 is None:
+            logger.error("Can't get LoRa EUI64 for %s", self.mac)
+            return False
+        self.lora_eui64 = lora_eui64.strip().lower()
+        logger.info("lora_eui64 for %s: %s", self.mac, self.lora_eui64)
 
         return True
 
@@ -185,7 +211,7 @@ class Conduit():
     # Get the gateway's user ID on a given jumphost #
     #################################################
     def set_jumphost_userid(self, jumphost: Jumphost, userid: int) -> bool:
-        if self.jumphost_userid == None:
+        if self.jumphost_userid is None:
             self.jumphost_userid = userid
         elif userid != self.jumphost_userid:
             raise self.Error("%s: %s: can't change jumphost_userid from %d to %d" % (self.mac, jumphost.hostname, self.jumphost_userid, userid))
@@ -210,99 +236,98 @@ class Conduit():
     # set date using ntp
     def set_date_using_ntp(self) -> bool:
         logger = self.logger
-        for i in range(3):
+        tries = Constants.NTP_TRIES
+        delay = Constants.NTP_RETRY_DELAY
+        for i in range(tries):
             answer = self.ssh.sudo("ntpdate -ub pool.ntp.org")
-            if answer != None and answer.ok:
+            if answer is not None and answer.ok:
                 return True
-            time.sleep(10)
+            # don't wait after the last attempt; back off between the others.
+            if i < tries - 1:
+                time.sleep(delay)
+                delay = min(delay * 2, Constants.NTP_RETRY_DELAY_MAX)
 
-        logger.error("%s: ntp date failed 3 times", self.mac)
+        logger.error("%s: ntp date failed %d times", self.mac, tries)
         return False
 
-    def mkdir(self, path: str | pathlib.Path, mode: int, user: str = "root", group: str = "root") -> bool:
-        logger = self.logger
+    # the commands to create a directory with the given mode and owner
+    def mkdir_commands(self, path: str | pathlib.Path, mode: int, user: str = "root", group: str = "root") -> list[str]:
+        # catch a mode written in hex or decimal rather than octal: those
+        # set the setuid/setgid/sticky bits, or bits beyond them, which
+        # none of our directories want.
+        if mode < 0 or mode & ~0o777:
+            raise ValueError("unexpected mode for %s: %#o" % (str(path), mode))
         safepath = shlex.quote(str(path))
-        answer = self.ssh.sudo("mkdir -p -m %o %s" % (mode, safepath))
-        if answer == None or not answer.ok:
-            logger.error("%s: could not create %s with mode %o", self.mac, str(path), mode)
-            return False
-        answer = self.ssh.sudo("chmod %o %s" % (mode, safepath))
-        if answer == None or not answer.ok:
-            logger.error("%s: could not chmod %s to %o", self.mac, safepath)
-            return False
-        answer = self.ssh.sudo("chown %s.%s %s" % (shlex.quote(user), shlex.quote(group), safepath))
-        if answer == None or not answer.ok:
-            logger.error("%s: could not change owner of %s", self.mac, path)
-            return False
-        return True
+        # mkdir -m sets the mode of a directory it creates; only one that
+        # was already there needs a chmod.
+        return [
+            "if test -d %s; then chmod %o %s; else mkdir -p -m %o %s; fi" % (safepath, mode, safepath, mode, safepath),
+            "chown %s.%s %s" % (shlex.quote(user), shlex.quote(group), safepath)
+            ]
 
-    def simplecmd(self, command: str, logfail: bool = True, /, **kwargs) -> bool:
+    # run a list of commands as root in one remote shell, stopping at the
+    # first one that fails.
+    def run_script(self, commands: list[str]) -> bool:
         logger = self.logger
         options = self.options
+        kwargs = dict()
         if options.debug:
             kwargs['hide'] = False
             kwargs['echo'] = True
 
-        answer = self.ssh.sudo(command, **kwargs)
-        if answer == None or not answer.ok:
-            logger.error("%s: failed: %s", self.mac, command)
+        answer = self.ssh.sudo("sh -c " + shlex.quote("\n".join([ "set -e" ] + commands)), **kwargs)
+        if answer is None:
+            logger.error("%s: script failed catastrophically", self.mac)
+            return False
+        if not answer.ok:
+            logger.error("%s: script failed with status %d: %s",
+                         self.mac, answer.exited,
+                         "" if answer.stderr is None else answer.stderr.strip())
             return False
         return True
 
-    # the worker
+    # the worker. Apart from setting the clock, which is retried, this is
+    # one script, so it's a single round trip to the Conduit.
     def setup_jumphost_tunnel(self, jumphost: Jumphost, authorized_keys: list[str]) -> bool:
         if not self.set_date_using_ntp():
             return False
 
-        var_root = pathlib.Path("/var/config/home")
-        if not self.mkdir(var_root, 0o755):
-            return False
-        var_root = var_root / "root"
-        if not self.mkdir(var_root, 0o700):
-            return False
-        if not self.mkdir(var_root / ".ssh", 0x700):
-            return False
-
-        var_auth_keys = var_root / ".ssh/authorized_keys"
+        var_home = pathlib.Path("/var/config/home")
+        var_root = var_home / "root"
+        var_root_ssh = var_root / ".ssh"
+        var_auth_keys = shlex.quote(str(var_root_ssh / "authorized_keys"))
         root_home = pathlib.Path("/home/root")
-        root_auth_keys = root_home / ".ssh/authorized_keys"
-        if not self.simplecmd("test -f " + str(var_auth_keys), logfail=False):
-            if self.simplecmd("test -f " + str(root_auth_keys), logfail=False):
-                if not self.simplecmd("sh -c " + shlex.quote(
-                    "cat " + str(root_auth_keys) + " >" + str(var_auth_keys)
-                    )):
-                    return False
-            else:
-                if not self.simplecmd("touch " + str(var_auth_keys)):
-                    return False
-            if not self.simplecmd("chmod 700 " + str(var_auth_keys)):
-                return False
-
-        # set contents of /var/config/... authorized_keys
-        cmd = "sh -c " + shlex.quote("printf '%s\n' >>" + str(var_auth_keys) + " " + shlex.join(authorized_keys))
-        if not self.simplecmd(cmd):
-            return False
-        if not self.simplecmd(f"sort -u -o {str(var_auth_keys)} {str(var_auth_keys)}"):
-            return False
+        root_auth_keys = shlex.quote(str(root_home / ".ssh/authorized_keys"))
+        root_ssh = shlex.quote(str(root_home / ".ssh"))
+        root_ssh_old = shlex.quote(str(root_home / ".ssh_old"))
+        link_target = shlex.quote(str(var_root_ssh))
+        link_dir = shlex.quote(str(root_home))
+
+        commands: list[str] = []
+        commands += self.mkdir_commands(var_home, 0o755)
+        commands += self.mkdir_commands(var_root, 0o700)
+        commands += self.mkdir_commands(var_root_ssh, 0o700)
+
+        # set contents of /var/config/... authorized_keys, starting from
+        # ~root's keys if there's nothing there yet.
+        commands += [
+            f"if ! test -f {var_auth_keys}; then",
+            f"  if test -f {root_auth_keys}; then cat {root_auth_keys} >{var_auth_keys}; else touch {var_auth_keys}; fi",
+            f"  chmod 700 {var_auth_keys}",
+            "fi",
+            f"printf '%s\\n' {shlex.join(authorized_keys)} >>{var_auth_keys}",
+            f"sort -u -o {var_auth_keys} {var_auth_keys}",
+            ]
 
         # if no ~root/.ssh, link it
-        # if ~root/.ssh and not a link, rm and link it
+        # if ~root/.ssh and not a link, move it aside and link it
         # if ~root/.ssh and a link, simply relink it
-        var_root_ssh = var_root / ".ssh"
-        root_ssh = root_home / ".ssh"
-        if not self.simplecmd("test -d " + str(root_ssh), logfail=False):
-            if not self.simplecmd(f"ln -fs {str(var_root_ssh)} {root_home}"):
-                return False
-        elif not self.simplecmd(f"test -L {root_ssh}", logfail=False):
-            # somewhat unpleasant and not atomic, but....
-            if not self.simplecmd(f"mv {str(root_ssh)} {str(root_home / ".ssh_old")}"):
-                return False
-            if not self.simplecmd(f"ln -s {str(var_root_ssh)} {root_home}"):
-                return False
-        else:
-            # atomic update: maybe no change
-            if not self.simplecmd(f"ln -fs {str(var_root_ssh)} {root_home}"):
-                return False
+        commands += [
+            f"if ! test -d {root_ssh}; then ln -fs {link_target} {link_dir}",
+            f"elif ! test -L {root_ssh}; then mv {root_ssh} {root_ssh_old}; ln -s {link_target} {link_dir}",
+            f"else ln -fs {link_target} {link_dir}",
+            "fi",
+            ]
 
         # now the ssh_tunnel defaults
         ssh_tunnel_lines = [
@@ -316,32 +341,27 @@ class Conduit():
             f'DAEMON_ARGS="-f -M {self.get_jumphost_keepalive(jumphost)} -o ServerAliveInterval=30 -o StrictHostKeyChecking=no -i /etc/ssh/ssh_host_rsa_key"',
             ]
 
-        default_tunnel_config=pathlib.Path("/etc/default/ssh_tunnel")
-        cmd = "sh -c " + shlex.quote("printf '%s\n' >" + str(default_tunnel_config) + " " + shlex.join(ssh_tunnel_lines))
-        if not self.simplecmd(cmd):
-            return False
-
-        if not self.simplecmd(f"chmod 755 {str(default_tunnel_config)}"):
-            return False
-        if not self.simplecmd(f"chown root.root {str(default_tunnel_config)}"):
-            return False
-
-        # copy the ssh tunnel file.
-        default_tunnel_script=pathlib.Path("/etc/init.d/ssh_tunnel")
-        cmd = "sh -c " + shlex.quote("printf '%s\n' >" + str(default_tunnel_script) + " " + shlex.join(self.settings["ssh_tunnel_script"]))
-        if not self.simplecmd(cmd):
-            return False
-
-        if not self.simplecmd(f"chmod 755 {str(default_tunnel_script)}"):
-            return False
-        if not self.simplecmd(f"chown root.root {str(default_tunnel_script)}"):
-            return False
+        default_tunnel_config = shlex.quote("/etc/default/ssh_tunnel")
+        commands += [
+            f"printf '%s\\n' {shlex.join(ssh_tunnel_lines)} >{default_tunnel_config}",
+            f"chmod 755 {default_tunnel_config}",
+            f"chown root.root {default_tunnel_config}",
+            ]
 
-        if not self.simplecmd(f"{str(default_tunnel_script)} restart"):
-            return False
+        # copy the ssh tunnel file, and restart it.
+        default_tunnel_script = shlex.quote("/etc/init.d/ssh_tunnel")
+        commands += [
+            f"printf '%s\\n' {shlex.join(self.settings['ssh_tunnel_script'])} >{default_tunnel_script}",
+            f"chmod 755 {default_tunnel_script}",
+            f"chown root.root {default_tunnel_script}",
+            f"{default_tunnel_script} restart",
+            ]
 
         # make sure the tunnel gets started.
-        if not self.simplecmd("update-rc.d ssh_tunnel defaults 95 30"):
+        commands += [ "update-rc.d ssh_tunnel defaults 95 30" ]
+
+        if not self.run_script(commands):
+            self.logger.error("%s: %s: tunnel setup script failed", self.mac, jumphost.hostname)
             return False
 
         return True
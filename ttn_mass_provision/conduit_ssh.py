@@ -15,8 +15,9 @@
 ##############################################################################
 
 #### imports ####
-import ipaddress
 import logging
+import random
+import time
 import typing
 
 Any = typing.Any
@@ -26,9 +27,13 @@ import warnings
 with warnings.catch_warnings():
    warnings.filterwarnings("ignore", message='.*cryptography')
    import fabric
+   import paramiko
 
 from .constants import Constants
 
+# the logger for this module
+_logger = logging.getLogger(__name__)
+
 ##############################################################################
 #
 # The Conduit SSH API
@@ -36,10 +41,12 @@ from .constants import Constants
 ##############################################################################
 
 class ConduitSsh():
-    def __init__(self, options: Any, host: Union[ipaddress.IPv4Address, str]):
+    __slots__ = ( 'options', 'connection', 'logger' )
+
+    def __init__(self, options: Any, host: str):
         self.options = options
         self.connection = fabric.Connection(
-                            host=str(host),
+                            host=host,
                             user=options.username,
                             connect_kwargs={
                                 "password": options.password,
@@ -48,16 +55,7 @@ class ConduitSsh():
                                 }
                             )
 
-        self.logger = logging.getLogger(__name__)
-        logger = self.logger
-
-        # set the log level
-        if options.debug:
-            logger.setLevel('DEBUG')
-        elif options.verbose:
-            logger.setLevel('INFO')
-        else:
-            logger.setLevel('WARNING')
+        self.logger = _logger
 
         pass
 
@@ -65,19 +63,43 @@ class ConduitSsh():
         """ this is the Exception thrown by class ConduitSsh """
         pass
 
-    # return TRUE if we can reach via SSH
+    # close the connection, if it's open. The connection is opened on first
+    # use and then reused for every command, so this is only needed when
+    # we're done with the Conduit.
+    def close(self) -> None:
+        try:
+            self.connection.close()
+        except Exception as error:
+            self.logger.debug("close failed: %s", error)
+
+    # return TRUE if we can reach via SSH. A gateway that has just booted
+    # may not answer yet, so retry a few times with a jittered backoff (we
+    # are usually pinging many gateways at once). A wrong password won't
+    # get better, so that fails at once.
     def ping(self, /, timeout: Union[int, None]=None) -> bool:
         self.logger.info("ping ssh")
         connection = self.connection
 
-        if timeout != None:
+        if timeout is not None:
             connection.connect_timeout = timeout
 
-        try:
-            _ = connection.run("echo ping", hide=True, timeout=5)
-            return True
-        except Exception as error:
-            return False
+        tries = Constants.SSH_PING_TRIES
+        delay = Constants.SSH_PING_RETRY_DELAY
+        for i in range(tries):
+            try:
+                _ = connection.run("echo ping", hide=True, in_stream=False, timeout=Constants.SSH_PING_TIMEOUT)
+                return True
+            except paramiko.AuthenticationException as error:
+                self.logger.debug("ping %s: %s", connection.host, error)
+                return False
+            except Exception as error:
+                self.logger.debug("ping %s: try %d failed: %s", connection.host, i + 1, error)
+
+            if i < tries - 1:
+                time.sleep(random.uniform(0.5, 1.0) * delay)
+                delay = min(delay * 2, Constants.SSH_PING_RETRY_DELAY_MAX)
+
+        return False
 
     def sudo(self, command: str, /, **kwargs) -> bool:
         self.logger.debug("sudo")
@@ -90,6 +112,11 @@ class ConduitSsh():
         if not 'warn' in kwargs:
             kwargs['warn'] = True
 
+        # we run commands from several threads at once; don't let each
+        # one read (and put the terminal into cbreak mode for) our stdin.
+        if not 'in_stream' in kwargs:
+            kwargs['in_stream'] = False
+
         try:
             result = connection.sudo(
                     command,
@@ -117,6 +144,10 @@ class ConduitSsh():
         if not 'warn' in run_kwargs:
             run_kwargs['warn'] = True
 
+        # as for sudo, don't read our stdin.
+        if not 'in_stream' in run_kwargs:
+            run_kwargs['in_stream'] = False
+
         try:
             result = connection.run(command, **run_kwargs)
             self.logger.debug("%s: result: %s", command, result)
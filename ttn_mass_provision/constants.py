@@ -15,7 +15,6 @@
 
 #### imports ####
 from pathlib import Path
-import re
 
 #### The Constants class
 class Constants:
@@ -34,5 +33,33 @@ class Constants:
         #### jumphost params ####
         JUMPHOST_FIRST_UID: int = 20000
         JUMPHOST_FIRST_KEEPALIVE: int = 40000
+        JUMPHOST_SCRIPT_MAX: int = 64 * 1024    # maximum size of a script sent to a jumphost in one command
+        JUMPHOST_CONNECT_TIMEOUT: float = 3.0   # seconds to wait for the jumphost's TCP connection
+        JUMPHOST_BANNER_TIMEOUT: float = 5.0    # seconds to wait for the jumphost's ssh banner
+        JUMPHOST_AUTH_TIMEOUT: float = 5.0      # seconds to wait for the jumphost to accept our key
+
+        #### network probe params ####
+        PROBE_PORT: int = 22                    # the port we try to open on each candidate host
+        PROBE_TIMEOUT: float = 1.0              # seconds to wait for each host to answer
+        PROBE_CONCURRENCY: int = 128            # maximum number of probes in flight at once
+        PROBE_STAGGER: float = 0.002            # seconds between launching successive probes
+        NETLINK_TIMEOUT: float = 2.0            # seconds to wait for each reply to the ARP table dump
+
+        #### gateway ssh params ####
+        SSH_MAX_WORKERS: int = 32               # maximum number of gateways we talk to at once
+        SSH_PING_TRIES: int = 3                 # number of times to try reaching a gateway over ssh
+        SSH_PING_TIMEOUT: float = 3.0           # seconds to wait for each try's "echo ping"
+        SSH_PING_RETRY_DELAY: float = 1.0       # seconds to wait after the first failure (before jitter)
+        SSH_PING_RETRY_DELAY_MAX: float = 4.0   # upper bound on the wait between tries
+
+        #### MultiTech hardware ####
+        MULTITECH_OUIS: frozenset[str] = frozenset({   # MultiTech's OUIs, lower case, ':' separated
+                "00:08:00",
+        })
+
+        #### gateway clock setting ####
+        NTP_TRIES: int = 3                      # number of times to try ntpdate
+        NTP_RETRY_DELAY: float = 2.0            # seconds to wait after the first failure
+        NTP_RETRY_DELAY_MAX: float = 10.0       # upper bound on the wait between tries
 
 ### end of file ###
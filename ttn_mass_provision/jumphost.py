@@ -15,7 +15,7 @@
 
 # imports
 import argparse
-import ipaddress
+import functools
 import logging
 from socket import getfqdn
 import shlex
@@ -28,6 +28,15 @@ from . constants import Constants
 from . settings import Settings
 from . jumphost_ssh import JumphostSsh
 
+# the logger for this module
+_logger = logging.getLogger(__name__)
+
+# the fully-qualified name of a host; this is a blocking DNS lookup,
+# and the answer won't change while we're running, so do it at most once.
+@functools.lru_cache(maxsize=None)
+def _getfqdn(hostname: str) -> str:
+    return getfqdn(hostname)
+
 ##############################################################################
 #
 # The Jumphost object
@@ -35,28 +44,24 @@ from . jumphost_ssh import JumphostSsh
 ##############################################################################
 
 class Jumphost:
-    def __init__(self, attr: Settings.JumphostAttributes, options: argparse.Namespace, settings: dict):
+    __slots__ = ( 'attr', 'hostname', 'options', 'logger', 'ssh', 'first_uid', 'first_keepalive' )
+
+    def __init__(self, attr: Settings.JumphostAttributes, options: argparse.Namespace):
         self.attr: Settings.JumphostAttributes = attr
         self.hostname: str = attr.hostname
-        self.fqdn: str = getfqdn(self.hostname)
         self.options = options
-        self.settings = settings
-        self.logger = logging.getLogger(__name__)
-        logger = self.logger
-
-        # set the log level
-        if options.debug:
-            logger.setLevel('DEBUG')
-        elif options.verbose:
-            logger.setLevel('INFO')
-        else:
-            logger.setLevel('WARNING')
+        self.logger = _logger
 
         self.ssh = JumphostSsh(options, host=self.hostname, username=attr.username, port=attr.port)
-        self.first_uid: int = Constants.JUMPHOST_FIRST_UID
-        self.first_keepalive: int = Constants.JUMPHOST_FIRST_KEEPALIVE
+        self.first_uid: int = attr.first_uid
+        self.first_keepalive: int = attr.first_keepalive
         pass
 
+    # the jumphost's fully-qualified name, looked up on first use.
+    @property
+    def fqdn(self) -> str:
+        return _getfqdn(self.hostname)
+
     def __str__(self) -> str:
         return str({ "attr": self.attr, "hostname": self.hostname, "ssh": self.ssh})
 
@@ -68,18 +73,17 @@ class Jumphost:
         logger = self.logger
         answer = self.ssh.do([ 'getent', dbname, entryname ])
         result: str | None = None
-        if answer == None:
+        if answer is None:
             logger.debug("getent %s failed completely", dbname)
             return None
 
         if answer.ok:
-            stdout_lines = answer.stdout.splitlines()
-            if len(stdout_lines) == 0:
-                logger.debug("%s: %s: doesn't exist: empty response", dbname, entryname)
-            elif len(stdout_lines[0].strip()) == 0:
-                logger.debug("%s: %s: doesn't exist: length of first line is zero", dbname, entryname)
+            # only the first line matters
+            first_line = answer.stdout.partition('\n')[0].strip()
+            if not first_line:
+                logger.debug("%s: %s: doesn't exist: first line is empty", dbname, entryname)
             else:
-                result = stdout_lines[0].strip()
+                result = first_line
                 logger.debug("%s: %s: exists, value %s", dbname, entryname, result)
         else:
             logger.debug("%s: %s: doesn't exist: getent exit status %d", dbname, entryname, answer.exited)
@@ -88,25 +92,22 @@ class Jumphost:
 
     # create gateway group
     def query_gateway_group(self, groupname: str) -> bool:
-        return self.query_getent("group", groupname) != None
+        return self.query_getent("group", groupname) is not None
 
-    # check and create gateway group: idempotent if group exists
+    # check and create gateway group: idempotent if group exists. The check
+    # only reads, so it's done without sudo (and so even with --noop); the
+    # groupadd is only sent if the group is missing.
     def create_gateway_group(self, groupname: str) -> bool:
         logger = self.logger
         if self.query_gateway_group(groupname):
             return True
 
-        answer = self.ssh.sudo(f"groupadd {shlex.quote(groupname)}")
-        if answer == None:
+        if self.run_scripts([[ f"groupadd {shlex.quote(groupname)}" ]]) is None:
+            logger.error("groupadd %s failed", groupname)
             return False
 
-        if answer.ok:
-            logger.info("created group %s", groupname)
-            return True
-
-        else:
-            logger.error("groupadd failed: %s", answer.stderr.strip())
-            return False
+        logger.info("created group %s", groupname)
+        return True
 
     #########################
     # Query a jumphost user #
@@ -114,10 +115,10 @@ class Jumphost:
     def query_jumphost_user(self, gateway_id: str) -> int | None:
         logger = self.logger
         answer = self.query_getent("passwd", gateway_id)
-        if answer == None:
+        if answer is None:
             return None
         try:
-            return int(answer.split(':')[2])
+            return int(answer.split(':', 3)[2])
         except Exception as e:
             logger.error("couldn't parse result of getent passwd %s: %s", gateway_id, answer)
             return None
@@ -126,98 +127,193 @@ class Jumphost:
     # Create a jumphost user; equivalent of create-jumphost-user.sh in conduit-mfg #
     ################################################################################
     def create_jumphost_user(self, desired_uid: int | None, gateway_name: str, gateway_id: str, gateway_groupname: str, gateway_userid = None) -> int | None:
-        logger = self.logger
+        return self.create_jumphost_users([ (desired_uid, gateway_name, gateway_id) ], gateway_groupname=gateway_groupname)[gateway_id]
 
-        current_uid = self.query_jumphost_user(gateway_id)
-        if current_uid != None:
-            if desired_uid != None and current_uid != desired_uid:
+    ################################################################################
+    # Create a batch of jumphost users, given as (desired_uid, gateway_name,       #
+    # gateway_id) tuples, in as few remote commands as possible. Returns a dict    #
+    # mapping each gateway_id to its uid, or to None if it couldn't be created.    #
+    ################################################################################
+    def create_jumphost_users(self, users: list[tuple[int | None, str, str]], gateway_groupname: str) -> dict[str, int | None]:
+        logger = self.logger
+        results: dict[str, int | None] = { gateway_id: None for _, _, gateway_id in users }
+        if not users:
+            return results
+
+        # look up the users that already exist with one getent; this only
+        # reads, so (unlike the sudo below) it's done even with --noop.
+        # getent exits 2 if some of the names aren't found.
+        reported: dict[str, tuple[str, int]] = dict()
+        answer = self.ssh.do([ 'getent', 'passwd' ] + [ gateway_id for _, _, gateway_id in users ])
+        if answer is None:
+            logger.error("%s: getent passwd failed completely", self.hostname)
+            return results
+        if not answer.exited in (0, 2):
+            logger.error("%s: getent passwd failed: exit status %d", self.hostname, answer.exited)
+            return results
+        for line in answer.stdout.splitlines():
+            self._parse_passwd_report("exists", line, reported)
+
+        # create the rest; for each user, the script reports
+        # "exists <passwd entry>", "created <passwd entry>" or
+        # "failed <gateway_id> <error>".
+        blocks: list[list[str]] = []
+        for desired_uid, gateway_name, gateway_id in users:
+            if gateway_id in reported:
+                continue
+
+            args = [
+                'useradd',
+                '--comment', gateway_name,
+                '--password', '*',
+                '--gid', gateway_groupname,
+                '--no-user-group',
+                '--create-home',
+                '--key', f'UID_MIN={self.attr.first_uid}'
+            ]
+
+            if desired_uid is not None:
+                args += [ "-u", str(desired_uid) ]
+
+            args += [ gateway_id ]
+
+            quoted_id = shlex.quote(gateway_id)
+            blocks.append([
+                f"if entry=$(getent passwd {quoted_id}); then printf 'exists %s\\n' \"$entry\"",
+                f"elif error=$({shlex.join(args)} 2>&1); then printf 'created %s\\n' \"$(getent passwd {quoted_id})\"",
+                f"else printf 'failed %s %s\\n' {quoted_id} \"$(printf '%s' \"$error\" | tr '\\n' ' ')\"",
+                "fi"
+                ])
+
+        if blocks:
+            output = self.run_scripts(blocks)
+            if output is None:
+                return results
+
+            for line in output.splitlines():
+                status, _, rest = line.partition(' ')
+                if status == "failed":
+                    gateway_id, _, error = rest.partition(' ')
+                    logger.error("useradd failed: %s: %s", gateway_id, error.strip())
+                    continue
+                self._parse_passwd_report(status, rest, reported)
+
+        for desired_uid, _, gateway_id in users:
+            if not gateway_id in reported:
+                continue
+            status, current_uid = reported[gateway_id]
+            if status == "created":
+                logger.info("%s: %s: created with uid=%d", self.hostname, gateway_id, current_uid)
+            elif desired_uid is not None and current_uid != desired_uid:
                 logger.error("%s: %s: uid conflict: current %d != desired %d", self.hostname, gateway_id, current_uid, desired_uid)
-                return None
+                continue
             else:
                 logger.info("%s: %s: already exists with UID=%d", self.hostname, gateway_id, current_uid)
-                return current_uid
-
-        args = [
-            'useradd',
-            '--comment', gateway_name,
-            '--password', '*',
-            '--gid', gateway_groupname,
-            '--no-user-group',
-            '--create-home',
-            '--key', f'UID_MIN={self.attr.first_uid}'
-        ]
-
-        if desired_uid != None:
-            args += [ "-u", str(desired_uid) ]
-
-        args += [ gateway_id ]
+            results[gateway_id] = current_uid
 
-        answer = self.ssh.sudo(args)
-        if answer == None:
-            return None
-        elif answer.ok:
-            current_uid = self.query_jumphost_user(gateway_id)
-            logger.info("%s: %s: created with uid=%s", self.hostname, gateway_id, str(current_uid))
-            return current_uid
-        else:
-            logger.error("useradd failed: %s", answer.stderr.strip())
-            return None
+        return results
 
-    # create the SSH linkage for gateway users. This is idempotent
-    def add_gateway_user_ssh_authorization(self, keys: list[str], username: str, gateway_group: str) -> bool:
+    # record the uid from a passwd entry in reported, as (status, uid),
+    # keyed by user name.
+    def _parse_passwd_report(self, status: str, entry: str, reported: dict[str, tuple[str, int]]) -> None:
+        try:
+            fields = entry.split(':', 3)
+            reported[fields[0]] = (status, int(fields[2]))
+        except Exception:
+            self.logger.error("couldn't parse result of getent passwd: %s", entry)
+
+    #################################################################
+    # Run shell commands as root in a few remote shells, instead of #
+    # one remote command each                                       #
+    #################################################################
+
+    # each block is a list of commands; blocks are packed, whole, into
+    # scripts whose "sh -c '...'" command is at most
+    # Constants.JUMPHOST_SCRIPT_MAX bytes once quoted (the script is passed
+    # as a single argument, and Linux limits those to 128k).
+    # Each script runs with `set -e`, so it stops at the first failure.
+    # Returns the combined stdout, or None if any script failed.
+    def run_scripts(self, blocks: list[list[str]]) -> str | None:
         logger = self.logger
         options = self.options
 
-        logger.debug("user %s: keys: %s", username, keys)
-
-        ssh_dir = shlex.quote("/home/" + username + "/.ssh")
-        answer = self.ssh.sudo("test -d " + ssh_dir, user=None)
+        # shlex.quote() wraps the whole script in one pair of quotes and
+        # grows each ' inside it to five characters, so each command adds
+        # the quoted length of its own line (less those two quotes).
+        scripts: list[list[str]] = []
+        script: list[str] = []
+        empty_len = len(self._script_command([]))
+        script_len = empty_len
+        for block in blocks:
+            block_len = sum(len(shlex.quote("\n" + command)) - 2 for command in block)
+            if script and script_len + block_len > Constants.JUMPHOST_SCRIPT_MAX:
+                scripts.append(script)
+                script, script_len = [], empty_len
+            script += block
+            script_len += block_len
+        if script:
+            scripts.append(script)
+
+        stdout = ""
+        for script in scripts:
+            command = self._script_command(script)
+            answer = self.ssh.sudo(command, show=options.debug, echo=options.debug)
 
-        if answer == None:
-            logger.error("%s: sudo to create .ssh dir failed catastrophically", self.hostname)
-            return False
-        if not answer.ok:
-            cmd = "mkdir -m 700 " + ssh_dir
-        else:
-            cmd = "chmod 700 " + ssh_dir
+            if answer is None:
+                logger.error("%s: script failed catastrophically", self.hostname)
+                return None
 
-        answer = self.ssh.sudo(cmd)
-        if answer == None:
-            logger.error("%s: can't setup .ssh directory: %s", self.hostname, cmd)
-        elif not answer.ok:
-            logger.error("%s: %s failed: stderr: %s", self.hostname, cmd, answer.stderr)
-            return False
+            if not answer.ok:
+                logger.error("%s: script failed:\n--stdout--:\n%s\n--stderr--:\n%s",
+                            self.hostname,
+                            "" if answer.stdout is None else answer.stdout.strip(),
+                            "" if answer.stderr is None else answer.stderr.strip())
+                return None
 
-        cmd = "chown " + shlex.quote(username) + "." + shlex.quote(gateway_group) + " " + ssh_dir
-        answer = self.ssh.sudo(cmd, user=None)
-        if answer == None:
-            logger.error("%s: can't setup .ssh directory: %s", self.hostname, cmd)
-        elif not answer.ok:
-            logger.error("%s: %s failed: stderr: %s", self.hostname, cmd, answer.stderr)
-            return False
+            if answer.stdout is not None:
+                stdout += answer.stdout
 
-        logger.info("%s: ~%s/.ssh exists with correct permissions", self.hostname, username)
+        return stdout
 
-        # now, put the authorized keys in the .ssh directory.
-        commands = [
-              "touch " + ssh_dir + "/authorized_keys",
-              "chown " + shlex.quote(username) + "." + shlex.quote(gateway_group) + " " + ssh_dir + "/authorized_keys",
-              "chmod 600 " + ssh_dir + "/authorized_keys",
-              "sh -c " + shlex.quote("printf '%s\n' >>" + ssh_dir + "/authorized_keys " + shlex.join(keys)),
-              "sort -u -o " + ssh_dir + "/authorized_keys " + ssh_dir + "/authorized_keys" ]
+    # the remote command that runs a script
+    def _script_command(self, script: list[str]) -> str:
+        return "sh -c " + shlex.quote("\n".join([ "set -e" ] + script))
 
-        for command in commands:
-            answer = self.ssh.sudo(command, show=options.debug, echo=options.debug)
+    # create the SSH linkage for gateway users. This is idempotent
+    def add_gateway_user_ssh_authorization(self, keys: list[str], username: str, gateway_group: str) -> bool:
+        return self.add_gateway_users_ssh_authorization([ (username, keys) ], gateway_group=gateway_group)
 
-            if answer == None:
-                logger.error("%s: failed catastrophically: %s", self.hostname, command)
-                return False
+    # create the SSH linkage for a batch of gateway users, given as
+    # (username, keys) pairs, in as few remote commands as possible.
+    # This is idempotent.
+    def add_gateway_users_ssh_authorization(self, users: list[tuple[str, list[str]]], gateway_group: str) -> bool:
+        logger = self.logger
 
-            if not answer.ok:
-                logger.error("%s: creating authorized_keys failed: %s\n--stdout--:\n%s\n--stderr--:\n%s",
-                            self.hostname, command,
-                            "" if answer.stdout == None else answer.stdout.strip(),
-                            "" if answer.stderr == None else answer.stderr.strip())
-                return False
+        quoted_group = shlex.quote(gateway_group)
+        blocks: list[list[str]] = []
+        for username, keys in users:
+            # the file is sorted and made unique remotely anyway; don't
+            # send the same key more than once.
+            keys = sorted(set(keys))
+            logger.debug("user %s: keys: %s", username, keys)
+
+            ssh_dir = shlex.quote("/home/" + username + "/.ssh")
+            authorized_keys = shlex.quote("/home/" + username + "/.ssh/authorized_keys")
+            owner = shlex.quote(username) + "." + quoted_group
+            blocks.append([
+                "test -d " + ssh_dir + " || mkdir -m 700 " + ssh_dir,
+                "chmod 700 " + ssh_dir,
+                "chown " + owner + " " + ssh_dir,
+                "touch " + authorized_keys,
+                "chown " + owner + " " + authorized_keys,
+                "chmod 600 " + authorized_keys,
+                "printf '%s\\n' " + shlex.join(keys) + " >>" + authorized_keys,
+                "sort -u -o " + authorized_keys + " " + authorized_keys
+                ])
+
+        if self.run_scripts(blocks) is None:
+            logger.error("%s: creating authorized_keys failed", self.hostname)
+            return False
 
+        logger.info("%s: authorized_keys set up for %d gateway users", self.hostname, len(users))
         return True
@@ -15,7 +15,6 @@
 ##############################################################################
 
 #### imports ####
-import ipaddress
 import logging
 import shlex
 import typing
@@ -30,6 +29,9 @@ with warnings.catch_warnings():
 
 from .constants import Constants
 
+# the logger for this module
+_logger = logging.getLogger(__name__)
+
 ##############################################################################
 #
 # The Jumphost SSH API
@@ -44,20 +46,13 @@ class JumphostSsh():
                             user=username,
                             port=port,
                             connect_kwargs={
-                                "timeout": 3
+                                "timeout": Constants.JUMPHOST_CONNECT_TIMEOUT,
+                                "banner_timeout": Constants.JUMPHOST_BANNER_TIMEOUT,
+                                "auth_timeout": Constants.JUMPHOST_AUTH_TIMEOUT
                                 }
                             )
 
-        self.logger = logging.getLogger(__name__)
-        logger = self.logger
-
-        # set the log level
-        if options.debug:
-            logger.setLevel('DEBUG')
-        elif options.verbose:
-            logger.setLevel('INFO')
-        else:
-            logger.setLevel('WARNING')
+        self.logger = _logger
 
         pass
 
@@ -65,26 +60,35 @@ class JumphostSsh():
         """ this is the Exception thrown by class JumphostSsh """
         pass
 
+    # close the connection, if it's open. The connection is opened on first
+    # use and then reused for every command, so this is only needed when
+    # we're done with the Jumphost.
+    def close(self) -> None:
+        try:
+            self.connection.close()
+        except Exception as error:
+            self.logger.debug("close failed: %s", error)
+
     # return TRUE if we can reach via SSH
     def ping(self, /, timeout: Union[int, None]=None) -> bool:
         self.logger.debug("ping ssh")
         connection = self.connection
 
-        if timeout != None:
+        if timeout is not None:
             connection.connect_timeout = timeout
 
         try:
-            _ = connection.run("echo ping", hide=True, timeout=5)
+            _ = connection.run("echo ping", hide=True, in_stream=False, timeout=5)
             return True
         except Exception as error:
             return False
 
-    def sudo(self, command: str | list, /, show=False, **sudo_kwargs) -> fabric.Result | None:
+    def sudo(self, command: str | list | tuple, /, show=False, **sudo_kwargs) -> fabric.Result | None:
         self.logger.debug("sudo")
         connection = self.connection
         options = self.options
 
-        if type(command) == list:
+        if isinstance(command, (list, tuple)):
             command = shlex.join(command)
 
         if 'hide' in sudo_kwargs:
@@ -94,6 +98,11 @@ class JumphostSsh():
         if not 'warn' in sudo_kwargs:
             sudo_kwargs['warn'] = True
 
+        # we run commands from several threads at once; don't let each
+        # one read (and put the terminal into cbreak mode for) our stdin.
+        if not 'in_stream' in sudo_kwargs:
+            sudo_kwargs['in_stream'] = False
+
         try:
             result = connection.sudo(
                     command,
@@ -110,12 +119,12 @@ class JumphostSsh():
                 self.logger.error("sudo %s failed", command)
             return None
 
-    def do(self, command: str | list, /, show=False, **run_kwargs) -> fabric.Result | None:
+    def do(self, command: str | list | tuple, /, show=False, **run_kwargs) -> fabric.Result | None:
         self.logger.debug("do")
         connection = self.connection
         options = self.options
 
-        if type(command) == list:
+        if isinstance(command, (list, tuple)):
             command = shlex.join(command)
 
         if 'hide' in run_kwargs:
@@ -125,6 +134,10 @@ class JumphostSsh():
         if not 'warn' in run_kwargs:
             run_kwargs['warn'] = True
 
+        # as for sudo, don't read our stdin.
+        if not 'in_stream' in run_kwargs:
+            run_kwargs['in_stream'] = False
+
         try:
             result = connection.run(command, hide=not show, **run_kwargs)
             self.logger.debug("%s: result: %s", command, result)
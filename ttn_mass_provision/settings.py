@@ -15,28 +15,26 @@
 
 #### imports ####
 from dataclasses import dataclass
-import jsons
-import pathlib
 
 @dataclass
-class Settings(jsons.JsonSerializable):
-    @dataclass
-    class ProductAttributes(jsons.JsonSerializable):
+class Settings:
+    @dataclass(frozen=True, slots=True)
+    class ProductAttributes:
         device_type: str
         device_class: str
         has_cellular: bool = False
 
-    @dataclass
-    class Organization(jsons.JsonSerializable):
+    @dataclass(frozen=True, slots=True)
+    class Organization:
         description: str
         prefix: str
         id: str
         gateway_group: str
-        org_dir: pathlib.Path
+        org_dir: str
         jumphosts: list[str]
 
-    @dataclass
-    class JumphostAttributes(jsons.JsonSerializable):
+    @dataclass(frozen=True, slots=True)
+    class JumphostAttributes:
         description: str                # the description of the jump host
         username: str                   # the username used when logging in
         hostname: str                   # the host name of the jump host